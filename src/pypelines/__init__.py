@@ -3,14 +3,25 @@
 
 
 import os
+import sys
 import time
 from glob import glob
 from typing import List
 from pypelines import workflows
+from pypelines.admission import AdmissionController
+from pypelines.caches.disk import DiskCache
+from pypelines.caches.redis import RedisCache
 from pypelines.coordinator import Coordinator
 from pypelines.emitters.limit import LimitEmitter
+from pypelines.emitters.record import RecordEmitter
+from pypelines.emitters.replay import ReplayEmitter
 from pypelines.emitters.schedule import ScheduleEmitter
 from pypelines.emitters.sse import SSEEmitter
+from pypelines.executors.docker import DockerExecutor
+from pypelines.executors.fake import FakeExecutor
+from pypelines.executors.local import LocalExecutor
+from pypelines.transports.rq import RqTransport
+from pypelines.transports.stream import StreamTransport
 
 
 def get_files_since(directory_path: str, since: int, patterns: List[str] = ['*']) -> List[str]:
@@ -23,19 +34,56 @@ def get_files_since(directory_path: str, since: int, patterns: List[str] = ['*']
 if __name__ == '__main__':
     redis_url = os.getenv('REDIS')
     container_prune_timeout = os.getenv('CONTAINER_PRUNE_TIMEOUT')
+    event_transport = os.getenv('EVENT_TRANSPORT', 'rq')
+    cache_directory = os.getenv('CACHE_DIRECTORY')
+    emitters = {
+        'limit': LimitEmitter(),
+        'schedule': ScheduleEmitter(),
+        'sse': SSEEmitter(redis_url),
+    }
+    executors = {
+        'docker': DockerExecutor(),
+        'local': LocalExecutor(),
+    }
+
+    # for capacity testing, events can be recorded, and later replayed (at a
+    # faster pace, and without actually executing jobs if so desired)
+    if os.getenv('RECORD_EVENTS'):
+        emitters = {name: RecordEmitter(emitter, os.getenv('RECORD_EVENTS')) for name, emitter in emitters.items()}
+    if os.getenv('REPLAY_EVENTS'):
+        speed = float(os.getenv('REPLAY_SPEED') or 1)
+        emitters = {name: ReplayEmitter(emitter, os.getenv('REPLAY_EVENTS'), speed) for name, emitter in emitters.items()}
+    admission = AdmissionController(redis_url)
+    if os.getenv('FAKE_EXECUTOR_DURATION'):
+        duration = float(os.getenv('FAKE_EXECUTOR_DURATION'))
+        executors = {name: FakeExecutor(duration, duration) for name in executors}
+        # there's no docker host to get the capacity from; pretend there is one
+        # the size of this machine
+        memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+        admission = AdmissionController(redis_url, capacity=('fake', float(os.cpu_count()), memory))
+
     coordinator = Coordinator(
-        {
-            'limit': LimitEmitter(),
-            'schedule': ScheduleEmitter(),
-            'sse': SSEEmitter(redis_url),
-        },
+        emitters,
         redis_url,
         {'default_timeout': -1},
         {'default_timeout': '1h'},
         {'default_timeout': '1h'},
         container_prune_timeout,
+        cache=DiskCache(cache_directory) if cache_directory else RedisCache(redis_url),
+        admission=admission,
+        executors=executors,
+        transport=StreamTransport(redis_url) if event_transport == 'stream' else RqTransport(),
     )
 
+    # `status` shows which node is running which emitter, cache metrics, and
+    # docker host utilization
+    if sys.argv[1:] == ['status']:
+        for status in coordinator.get_emitter_status():
+            print(f'{status["id"]} {status["event"]} {status["state"]} {status["owner"] or "-"}')
+        print(' '.join(f'cache-{key}={value}' for key, value in coordinator.cache.get_stats().items()))
+        print(' '.join(f'{key}={value:.2f}' for key, value in coordinator.admission.get_status().items()))
+        sys.exit(0)
+
     # we'll have 2 types of workflows:
     # - user workflows; the plain no-frills workflows
     # - system workflows, the ones the codebase ships with, which can be used
@@ -46,17 +94,21 @@ if __name__ == '__main__':
     # for testing purposes, the example workflows directory will also be mounted,
     # so it can copy over those
     # user workflows will obviously not expose that volume as that would be a
-    # vector for abuse
+    # vector for abuse, nor will they be allowed to run outside of containers
     system_workflows_directory = f'{os.getcwd()}/workflows/system'
     user_workflows_directory = f'{os.getcwd()}/workflows/user'
     example_workflows_directory = f'{os.getcwd()}/workflows/example'
     user_workflows_volumes = {}
     system_workflows_volumes = {user_workflows_directory: '/workflows', example_workflows_directory: '/workflows_example'}
 
+    # docker creates missing volume directories when mounting them, but local
+    # executors do not
+    os.makedirs(user_workflows_directory, exist_ok=True)
+
     # register system workflows
     system_workflow_paths = get_files_since(system_workflows_directory, 0, ['*.yaml', '*.yml'])
     for path in system_workflow_paths:
-        coordinator.register_workflow(path, workflows.load_from_file(path), system_workflows_volumes)
+        coordinator.register_workflow(path, workflows.load_from_file(path), system_workflows_volumes, ['docker', 'local'])
 
     # register user workflows and monitor changes
     previous_check_time = 0
@@ -68,7 +120,16 @@ if __name__ == '__main__':
             except Exception as e:
                 print(f'Error registering workflow: {e}')
 
+        # deregister workflows that have been removed
+        for workflow_id in coordinator.get_workflow_ids():
+            if not os.path.exists(workflow_id):
+                coordinator.deregister_workflow(workflow_id)
+
         previous_check_time = time.time()
 
+        # take over emitters whose node has died, and drop those that are no
+        # longer needed
+        coordinator.supervise_emitters()
+
         # monitor workflows every minute
         time.sleep(60)
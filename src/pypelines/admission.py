@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import re
+import subprocess
+import time
+import uuid
+from redis import Redis
+from typing import Dict, Tuple, Union
+from pypelines.types import ResourcesConfig
+
+
+# atomically drop expired reservations, then add a new one if it fits within the
+# remaining capacity; if nothing is reserved, a reservation is always accepted,
+# otherwise a job that exceeds the host's capacity would never run
+RESERVE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local reserved_containers = 0
+local reserved_cpus = 0
+local reserved_memory = 0
+local reservations = redis.call('hgetall', KEYS[1])
+for i = 1, #reservations, 2 do
+    local cpus, memory, expiry = string.match(reservations[i + 1], '(%S+) (%S+) (%S+)')
+    if tonumber(expiry) < now then
+        redis.call('hdel', KEYS[1], reservations[i])
+    else
+        reserved_containers = reserved_containers + 1
+        reserved_cpus = reserved_cpus + tonumber(cpus)
+        reserved_memory = reserved_memory + tonumber(memory)
+    end
+end
+
+local cpus = tonumber(ARGV[3])
+local memory = tonumber(ARGV[4])
+if reserved_containers > 0 and (
+    reserved_containers + 1 > tonumber(ARGV[8]) or
+    reserved_cpus + cpus > tonumber(ARGV[5]) or
+    reserved_memory + memory > tonumber(ARGV[6])
+) then
+    return 0
+end
+
+redis.call('hset', KEYS[1], ARGV[2], ARGV[3] .. ' ' .. ARGV[4] .. ' ' .. ARGV[7])
+return 1
+"""
+
+
+class CapacityError(Exception):
+    """
+    Raised when there is no capacity (yet) to start a job; `jobs.run()` raises
+    it with the jobs that remain to be run, and the data to run them with.
+    """
+
+
+def parse_memory(memory: Union[str, int]) -> int:
+    """
+    Converts docker's memory notation (e.g. `512m`, `2g`) into bytes.
+    """
+
+    if type(memory) is int:
+        return memory
+
+    match = re.fullmatch(r'(\d+)([bkmg]?)', memory.lower())
+    assert match, f'Invalid memory: {memory}'
+    return int(match.group(1)) * 1024 ** 'bkmg'.index(match.group(2) or 'b')
+
+
+class AdmissionController:
+    """
+    Keeps track of the containers, CPU & memory reserved on a docker host, and
+    holds off launching more containers until there is capacity for them.
+    Jobs that don't specify their resources still count towards the maximum
+    amount of containers (which defaults to twice the amount of CPUs).
+
+    All workers that share a docker host (e.g. by mounting the same docker
+    socket) share its capacity, so reservations are tracked per docker host
+    rather than per worker.
+    Reservations expire after `reservation_ttl` seconds, so that those of a
+    worker that died don't linger forever.
+    """
+
+    def __init__(
+            self,
+            redis_url: str,
+            default_resources: ResourcesConfig = {},
+            max_containers: int = None,
+            reservation_ttl: int = 3600,
+            poll_interval: float = 1,
+            capacity: Tuple[str, float, int] = None,
+    ):
+        self.__setstate__(locals())
+
+
+    # Redis instance is not pickleable, so let's only expose the details required
+    # to reinitialize things after unpickling
+    def __getstate__(self):
+        return {
+            'redis_url': self.redis_url,
+            'default_resources': self.default_resources,
+            'max_containers': self.max_containers,
+            'reservation_ttl': self.reservation_ttl,
+            'poll_interval': self.poll_interval,
+            'capacity': self.static_capacity,
+        }
+
+
+    def __setstate__(self, state: dict):
+        self.redis_url = state['redis_url']
+        self.redis = Redis.from_url(self.redis_url)
+        self.default_resources = state['default_resources']
+        self.max_containers = state['max_containers']
+        self.reservation_ttl = state['reservation_ttl']
+        self.poll_interval = state['poll_interval']
+        self.static_capacity = state['capacity']
+        self.capacity = state['capacity']
+
+
+    def get_capacity(self) -> Tuple[str, float, int]:
+        """
+        Returns the docker host's id, and its amount of CPUs & memory.
+        These are looked up once, unless a static capacity was provided (e.g.
+        when there is no docker host to begin with).
+        """
+
+        if self.capacity is None:
+            output = subprocess.run(
+                ['docker', 'info', '--format', '{{.ID}} {{.NCPU}} {{.MemTotal}}'],
+                shell=False,
+                check=True,
+                capture_output=True,
+                text=True,
+            )
+            host, cpus, memory = output.stdout.split()
+            self.capacity = host, float(cpus), int(memory)
+        return self.capacity
+
+
+    def get_max_containers(self) -> int:
+        _, cpu_capacity, _ = self.get_capacity()
+        return self.max_containers if self.max_containers is not None else int(cpu_capacity * 2)
+
+
+    def try_reserve(self, resources: ResourcesConfig = {}) -> Union[str, None]:
+        """
+        Reserves the requested resources if they're available, and returns a
+        reservation id to be passed to `release()` afterwards, or None if they
+        are not.
+        """
+
+        resources = {**self.default_resources, **resources}
+        cpus = float(resources.get('cpus', 0))
+        memory = parse_memory(resources.get('memory', 0))
+        host, cpu_capacity, memory_capacity = self.get_capacity()
+        reservation = str(uuid.uuid4())
+
+        reserved = self.redis.eval(
+            RESERVE_SCRIPT,
+            1,
+            f'admission-{host}',
+            time.time(),
+            reservation,
+            cpus,
+            memory,
+            cpu_capacity,
+            memory_capacity,
+            time.time() + self.reservation_ttl,
+            self.get_max_containers(),
+        )
+        return reservation if reserved else None
+
+
+    def release(self, reservation: str) -> None:
+        host, _, _ = self.get_capacity()
+        self.redis.hdel(f'admission-{host}', reservation)
+
+
+    def record_wait(self, name: str, seconds: float) -> None:
+        pipeline = self.redis.pipeline()
+        pipeline.incrbyfloat(f'admission-wait-{name}-total', seconds)
+        pipeline.incr(f'admission-wait-{name}-count')
+        pipeline.execute()
+
+
+    def get_status(self) -> Dict[str, float]:
+        """
+        Returns this docker host's reserved share of containers, CPU & memory, and the
+        average amount of seconds jobs have been waiting, both in the queue and
+        for admission.
+        """
+
+        host, cpu_capacity, memory_capacity = self.get_capacity()
+        reserved_containers = 0
+        reserved_cpus = 0
+        reserved_memory = 0
+        for details in self.redis.hvals(f'admission-{host}'):
+            cpus, memory, expiry = details.decode('utf-8').split(' ')
+            if float(expiry) >= time.time():
+                reserved_containers += 1
+                reserved_cpus += float(cpus)
+                reserved_memory += int(memory)
+
+        status = {
+            'container-utilization': reserved_containers / self.get_max_containers(),
+            'cpu-utilization': reserved_cpus / cpu_capacity,
+            'memory-utilization': reserved_memory / memory_capacity,
+        }
+        for name in ['queue', 'admission']:
+            total = float(self.redis.get(f'admission-wait-{name}-total') or 0)
+            count = int(self.redis.get(f'admission-wait-{name}-count') or 0)
+            status[f'{name}-wait'] = total / count if count else 0
+        return status
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class Cache(ABC):
+    def __init__(self, default_ttl: int = 86400, max_size: int = 100 * 1024 * 1024):
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """
+        Returns the output previously stored for a key, or None if there is no
+        (unexpired) result for it.
+        Implementations are expected to count hits & misses (see `get_stats()`).
+        """
+
+        raise NotImplementedError('get must be implemented')
+
+
+    @abstractmethod
+    def set(self, key: str, output: str, ttl: int = None) -> None:
+        """
+        Stores the output of a job or step for `ttl` seconds (or `default_ttl`
+        when not provided).
+        Once the total size of all stored results exceeds `max_size` bytes, the
+        least recently used results must be evicted.
+        """
+
+        raise NotImplementedError('set must be implemented')
+
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Returns hit/miss metrics, as well as the amount of entries & bytes in use.
+        """
+
+        raise NotImplementedError('get_stats must be implemented')
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import fcntl
+import os
+import tempfile
+import time
+from typing import Dict, Optional
+from pypelines.cache import Cache
+
+
+class DiskCache(Cache):
+    """
+    Stores results as files in a local directory, which is only shared by the
+    workers on the same node (or those mounting the same volume).
+
+    Each file starts with the time it expires at, followed by the output. Its
+    modification time is bumped on every hit, so that the least recently used
+    results can be evicted once `max_size` is exceeded.
+    Hit/miss metrics are kept in files alongside the results, so they're
+    shared by all processes (every rq job runs in one of its own) as well.
+    """
+
+    def __init__(self, directory: str, default_ttl: int = 86400, max_size: int = 100 * 1024 * 1024):
+        super().__init__(default_ttl, max_size)
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+
+    def get(self, key: str) -> Optional[str]:
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'r') as file:
+                expires, output = file.read().split('\n', 1)
+        except (FileNotFoundError, ValueError):
+            self.count('misses')
+            return None
+
+        if float(expires) < time.time():
+            self.count('misses')
+            self.forget(key)
+            return None
+
+        self.count('hits')
+        os.utime(path)
+        return output
+
+
+    def set(self, key: str, output: str, ttl: int = None) -> None:
+        data = f'{time.time() + (ttl or self.default_ttl)}\n{output}'
+        if len(data.encode('utf-8')) > self.max_size:
+            return
+
+        # write to a temporary file first, so that concurrent readers never
+        # get to see a partially written result
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(data)
+        os.replace(temp_path, os.path.join(self.directory, key))
+
+        self.evict()
+
+
+    def count(self, name: str) -> None:
+        # hold an exclusive lock while incrementing, or concurrent increments
+        # would get lost
+        descriptor = os.open(os.path.join(self.directory, f'.{name}'), os.O_RDWR | os.O_CREAT, 0o644)
+        with os.fdopen(descriptor, 'r+') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            value = int(file.read() or 0)
+            file.seek(0)
+            file.write(str(value + 1))
+            file.truncate()
+
+
+    def get_count(self, name: str) -> int:
+        try:
+            with open(os.path.join(self.directory, f'.{name}'), 'r') as file:
+                fcntl.flock(file, fcntl.LOCK_SH)
+                return int(file.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+
+    def forget(self, key: str) -> None:
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except FileNotFoundError:
+            pass
+
+
+    def get_entries(self) -> list:
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+
+    def evict(self) -> None:
+        entries = sorted(self.get_entries())
+        size = sum(entry_size for _, entry_size, _ in entries)
+        for _, entry_size, name in entries:
+            if size <= self.max_size:
+                break
+            self.forget(name)
+            size -= entry_size
+
+
+    def get_stats(self) -> Dict[str, int]:
+        entries = self.get_entries()
+        return {
+            'hits': self.get_count('hits'),
+            'misses': self.get_count('misses'),
+            'entries': len(entries),
+            'size': sum(entry_size for _, entry_size, _ in entries),
+        }
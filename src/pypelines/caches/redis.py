@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import time
+from redis import Redis
+from typing import Dict, Optional
+from pypelines.cache import Cache
+
+
+class RedisCache(Cache):
+    """
+    Stores results in Redis, where they're shared by all workers.
+
+    Every result is stored under its own key with a TTL; alongside, an index of
+    last access times and sizes is kept to evict the least recently used results
+    once `max_size` is exceeded.
+    """
+
+    def __init__(self, redis_url: str, default_ttl: int = 86400, max_size: int = 100 * 1024 * 1024):
+        self.__setstate__(locals())
+
+
+    # Redis instance is not pickleable, so let's only expose the details required
+    # to reinitialize things after unpickling
+    def __getstate__(self):
+        return {
+            'redis_url': self.redis_url,
+            'default_ttl': self.default_ttl,
+            'max_size': self.max_size,
+        }
+
+
+    def __setstate__(self, state: dict):
+        super().__init__(state['default_ttl'], state['max_size'])
+        self.redis_url = state['redis_url']
+        self.redis = Redis.from_url(self.redis_url)
+
+
+    def get(self, key: str) -> Optional[str]:
+        output = self.redis.get(f'cache-{key}')
+        if output is None:
+            self.redis.incr('cache-misses')
+            # result may have expired; make sure it no longer counts towards size
+            if self.redis.zscore('cache-index', key) is not None:
+                self.forget(key)
+            return None
+
+        self.redis.incr('cache-hits')
+        self.redis.zadd('cache-index', {key: time.time()})
+        return output.decode('utf-8')
+
+
+    def set(self, key: str, output: str, ttl: int = None) -> None:
+        data = output.encode('utf-8')
+        if len(data) > self.max_size:
+            return
+
+        previous_size = int(self.redis.hget('cache-sizes', key) or 0)
+        pipeline = self.redis.pipeline()
+        pipeline.set(f'cache-{key}', data, ex=ttl or self.default_ttl)
+        pipeline.hset('cache-sizes', key, len(data))
+        pipeline.incrby('cache-size', len(data) - previous_size)
+        pipeline.zadd('cache-index', {key: time.time()})
+        pipeline.execute()
+
+        # evict least recently used results until we're back within bounds
+        while int(self.redis.get('cache-size') or 0) > self.max_size:
+            oldest = self.redis.zrange('cache-index', 0, 0)
+            if not oldest:
+                break
+            self.forget(oldest[0].decode('utf-8'))
+
+
+    def forget(self, key: str) -> None:
+        size = int(self.redis.hget('cache-sizes', key) or 0)
+        pipeline = self.redis.pipeline()
+        pipeline.delete(f'cache-{key}')
+        pipeline.hdel('cache-sizes', key)
+        pipeline.decrby('cache-size', size)
+        pipeline.zrem('cache-index', key)
+        pipeline.execute()
+
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            'hits': int(self.redis.get('cache-hits') or 0),
+            'misses': int(self.redis.get('cache-misses') or 0),
+            'entries': self.redis.zcard('cache-index'),
+            'size': int(self.redis.get('cache-size') or 0),
+        }
@@ -2,12 +2,22 @@
 # -*- coding: utf-8 -*-
 
 
+import hashlib
 import pickle
+import time
 from typing import Dict, List, Union
 from redis import Redis
-from rq import Queue
+from rq import Queue, Worker, get_current_job
+from rq.utils import utcnow
 from pypelines import expressions, jobs, workflows
+from pypelines.admission import AdmissionController, CapacityError
+from pypelines.cache import Cache
 from pypelines.emitter import Emitter
+from pypelines.executor import Executor
+from pypelines.executors.docker import DockerExecutor
+from pypelines.leases import Lease, get_node_name, get_owner_name
+from pypelines.transport import Transport
+from pypelines.transports.rq import RqTransport
 from pypelines.types import EmitterArgs, EventPayload, EventArgs, EventName, Workflow, WorkflowId
 
 
@@ -20,6 +30,12 @@ class Coordinator:
             event_queue_args: dict = {},
             job_queue_args: dict = {},
             container_prune_timeout: Union[str, int] = None,
+            emitter_lease_ttl: int = 30,
+            emitter_enqueue_ttl: int = 3600,
+            cache: Cache = None,
+            admission: AdmissionController = None,
+            executors: Dict[str, Executor] = None,
+            transport: Transport = None,
     ):
         self.__setstate__(locals())
 
@@ -34,6 +50,12 @@ class Coordinator:
             'event_queue_args': self.event_queue_args,
             'job_queue_args': self.job_queue_args,
             'container_prune_timeout': self.container_prune_timeout,
+            'emitter_lease_ttl': self.emitter_lease_ttl,
+            'emitter_enqueue_ttl': self.emitter_enqueue_ttl,
+            'cache': self.cache,
+            'admission': self.admission,
+            'executors': self.executors,
+            'transport': self.transport,
         }
 
 
@@ -48,6 +70,12 @@ class Coordinator:
         self.job_queue_args = state['job_queue_args']
         self.job_queue = Queue('job', connection=self.redis, **state['job_queue_args'])
         self.container_prune_timeout = state['container_prune_timeout']
+        self.emitter_lease_ttl = state['emitter_lease_ttl']
+        self.emitter_enqueue_ttl = state['emitter_enqueue_ttl']
+        self.cache = state['cache']
+        self.admission = state['admission']
+        self.executors = state['executors'] if state['executors'] is not None else {'docker': DockerExecutor()}
+        self.transport = state['transport'] if state['transport'] is not None else RqTransport()
 
 
     def register_workflow(
@@ -55,31 +83,224 @@ class Coordinator:
             workflow_id: WorkflowId,
             workflow: Workflow,
             volumes: dict = {},
+            executors: List[str] = ['docker'],
     ) -> None:
         workflows.validate(workflow)
 
-        for event_name, event_config in workflow['on'].items():
+        # only trusted workflows may be allowed to use executors other than docker
+        for job in workflow['jobs'].values():
+            executor = job.get('executor', workflow.get('executor', 'docker'))
+            assert executor in self.executors, f'No executor found for {executor}'
+            assert executor in executors, f'Executor {executor} not allowed'
+
+        for event_name in workflow['on']:
             assert event_name in self.emitters, f'No emitter found for {event_name}'
 
+        # stop feeding events from emitters that a previous version of this
+        # workflow used, but this one no longer does (e.g. changed SSE stream)
+        emitter_ids = self.get_workflow_emitters(workflow)
+        previous_emitter_ids = self.get_workflow_emitters(self.get_workflow(workflow_id)[0]) if self.redis.exists(workflow_id) else {}
+        for emitter_id, (event_name, emitter, emitter_args) in previous_emitter_ids.items():
+            if emitter_id not in emitter_ids:
+                self.redis.lrem(pickle.dumps((emitter, emitter_args)), 0, workflow_id)
+                self.prune_emitter(emitter_id)
+
+        for emitter_id, (event_name, emitter, emitter_args) in emitter_ids.items():
+            event_emitter_key = pickle.dumps((emitter, emitter_args))
+
+            # register & enqueue emitter if it doesn't already exist; this
+            # is atomic, so concurrent registrations can't both enqueue it
+            # (and even if it were enqueued twice, only one would be able
+            # to acquire its lease)
+            if self.redis.hsetnx('emitters', emitter_id, pickle.dumps((event_name, emitter, emitter_args))):
+                self.enqueue_emitter(event_name, emitter, emitter_args)
+
+            # push workflow id to emitter/workflow map if it's not already there
+            workflow_ids = [workflow.decode('utf-8') for workflow in self.redis.lrange(event_emitter_key, 0, -1)]
+            if not workflow_id in workflow_ids:
+                self.redis.rpush(event_emitter_key, workflow_id)
+
+        # store workflow
+        self.redis.set(workflow_id, pickle.dumps((workflow, volumes)))
+        self.redis.sadd('workflows', workflow_id)
+
+
+    def deregister_workflow(self, workflow_id: WorkflowId) -> None:
+        self.redis.srem('workflows', workflow_id)
+        if not self.redis.exists(workflow_id):
+            return
+
+        emitter_ids = self.get_workflow_emitters(self.get_workflow(workflow_id)[0])
+        self.redis.delete(workflow_id)
+        for emitter_id, (event_name, emitter, emitter_args) in emitter_ids.items():
+            self.redis.lrem(pickle.dumps((emitter, emitter_args)), 0, workflow_id)
+            self.prune_emitter(emitter_id)
+
+
+    def get_workflow_ids(self) -> List[WorkflowId]:
+        return [workflow_id.decode('utf-8') for workflow_id in self.redis.smembers('workflows')]
+
+
+    def get_workflow(self, workflow_id: WorkflowId) -> tuple:
+        workflow_details = self.redis.get(workflow_id)
+        return pickle.loads(workflow_details) if workflow_details else (None, None)
+
+
+    def get_workflow_emitters(self, workflow: Workflow) -> Dict[str, tuple]:
+        """
+        Returns the emitters (event name, emitter & args, by emitter id) that
+        the given workflow needs, based on the emitters currently configured.
+        """
+
+        emitters = {}
+        for event_name, event_config in (workflow['on'].items() if workflow else []):
             if event_name in self.emitters:
                 emitter = self.emitters[event_name]
-                emitter_args = emitter.get_worker_config(event_name, workflow['on'][event_name])
-                event_emitter_key = pickle.dumps((emitter, emitter_args))
+                emitter_args = emitter.get_worker_config(event_name, event_config)
+                emitter_id = self.get_emitter_id(pickle.dumps((emitter, emitter_args)))
+                emitters[emitter_id] = event_name, emitter, emitter_args
+        return emitters
 
-                # enqueue emitter if it doesn't already exist
-                if not self.redis.exists(event_emitter_key):
-                    self.emitter_queue.enqueue(
-                        self.run_emitter,
-                        args=(event_name, emitter, emitter_args),
-                    )
 
-                # push workflow id to emitter/workflow map if it's not already there
-                workflow_ids = [workflow.decode('utf-8') for workflow in self.redis.lrange(event_emitter_key, 0, -1)]
-                if not workflow_id in workflow_ids:
-                    self.redis.rpush(event_emitter_key, workflow_id)
+    def prune_emitter(self, emitter_id: str) -> None:
+        """
+        Deregisters an emitter once no stored workflow needs it anymore: e.g. its
+        workflows have been removed or changed, or the emitters have since been
+        configured differently (e.g. recording vs replaying events).
+        A running emitter will notice and stop once its next event comes in.
+        """
+
+        emitter_details = self.redis.hget('emitters', emitter_id)
+        if not emitter_details:
+            return
+
+        event_name, emitter, emitter_args = pickle.loads(emitter_details)
+        event_emitter_key = pickle.dumps((emitter, emitter_args))
+        for workflow_id in self.redis.lrange(event_emitter_key, 0, -1):
+            workflow, _ = self.get_workflow(workflow_id.decode('utf-8'))
+            if emitter_id not in self.get_workflow_emitters(workflow):
+                self.redis.lrem(event_emitter_key, 0, workflow_id)
+
+        if self.redis.llen(event_emitter_key) == 0:
+            self.redis.hdel('emitters', emitter_id)
+            self.redis.srem('emitters-completed', emitter_id)
+            self.redis.delete(event_emitter_key, f'emitter-enqueued-{emitter_id}')
+
+
+    def get_emitter_id(self, event_emitter_key: bytes) -> str:
+        return hashlib.sha1(event_emitter_key).hexdigest()
+
+
+    def enqueue_emitter(
+            self,
+            event_name: EventName,
+            emitter: Emitter,
+            emitter_args: EmitterArgs,
+    ) -> None:
+        """
+        Enqueues an emitter, unless it is already waiting in the queue: when all
+        workers are busy, it may take a while before it gets picked up, and it
+        shouldn't pile up in the meantime.
+        The marker expires eventually, in case the queued job got lost.
+        """
+
+        emitter_id = self.get_emitter_id(pickle.dumps((emitter, emitter_args)))
+        if self.redis.set(f'emitter-enqueued-{emitter_id}', 1, nx=True, ex=self.emitter_enqueue_ttl):
+            self.emitter_queue.enqueue(
+                self.run_emitter,
+                args=(event_name, emitter, emitter_args),
+            )
+
+
+    def get_emitter_lease(self, emitter_id: str) -> Lease:
+        return Lease(self.redis, f'emitter-lease-{emitter_id}', get_owner_name(), self.emitter_lease_ttl)
+
+
+    def get_emitter_load(self) -> Dict[str, int]:
+        """
+        Returns the amount of emitters currently running on every active node.
+        Nodes are the hosts running workers for the emitter queue; each may run
+        multiple workers, but they'll be sharing the same resources.
+        """
+
+        load = {worker.hostname: 0 for worker in Worker.all(queue=self.emitter_queue)}
+        for emitter_id in self.redis.hkeys('emitters'):
+            owner = self.redis.get(f'emitter-lease-{emitter_id.decode("utf-8")}')
+            node = owner.decode('utf-8').rsplit(':', 1)[0] if owner else None
+            if node in load:
+                load[node] += 1
+        return load
+
 
-            # store workflow
-            self.redis.set(workflow_id, pickle.dumps((workflow, volumes)))
+    def should_run_emitter(self, emitter_id: str) -> bool:
+        """
+        Emitters are long-running, so they should be spread evenly across nodes:
+        a node that is already running more emitters than the least busy node
+        will pass on the emitter in the hope of it being picked up elsewhere.
+        Because there's no telling which worker will dequeue it next, it'll only
+        be passed on once per active node before being accepted anyway.
+        """
+
+        node = get_node_name()
+        load = self.get_emitter_load()
+        load[node] = load.get(node, 0)
+        if load[node] <= min(load.values()):
+            return True
+
+        declines_key = f'emitter-declines-{emitter_id}'
+        declines = self.redis.incr(declines_key)
+        self.redis.expire(declines_key, self.emitter_lease_ttl)
+        return declines > len(load)
+
+
+    def supervise_emitters(self) -> None:
+        """
+        Re-enqueues emitters that have not finished, but are not currently held
+        by anyone: i.e. their lease expired because the node running them died.
+        Emitters that are no longer needed by any workflow are dropped instead.
+        Likewise, the transport gets to restart whatever consumes events.
+        """
+
+        self.transport.supervise(self)
+
+        for emitter_id in self.redis.hkeys('emitters'):
+            self.prune_emitter(emitter_id.decode('utf-8'))
+
+        completed = {emitter_id.decode('utf-8') for emitter_id in self.redis.smembers('emitters-completed')}
+        for emitter_id, emitter_details in self.redis.hgetall('emitters').items():
+            emitter_id = emitter_id.decode('utf-8')
+            if emitter_id in completed or self.redis.exists(f'emitter-lease-{emitter_id}'):
+                continue
+
+            event_name, emitter, emitter_args = pickle.loads(emitter_details)
+            self.enqueue_emitter(event_name, emitter, emitter_args)
+
+
+    def get_emitter_status(self) -> List[dict]:
+        completed = {emitter_id.decode('utf-8') for emitter_id in self.redis.smembers('emitters-completed')}
+        status = []
+        for emitter_id, emitter_details in self.redis.hgetall('emitters').items():
+            emitter_id = emitter_id.decode('utf-8')
+            event_name, emitter, emitter_args = pickle.loads(emitter_details)
+            owner = self.redis.get(f'emitter-lease-{emitter_id}')
+            if emitter_id in completed:
+                state = 'completed'
+            elif owner:
+                state = 'running'
+            elif self.redis.exists(f'emitter-enqueued-{emitter_id}'):
+                state = 'queued'
+            else:
+                state = 'pending'
+
+            status.append({
+                'id': emitter_id,
+                'event': event_name,
+                'args': emitter_args,
+                'state': state,
+                'owner': owner.decode('utf-8') if owner else None,
+                'ttl': self.redis.pttl(f'emitter-lease-{emitter_id}') / 1000 if owner else None,
+            })
+        return status
 
 
     def run_emitter(
@@ -88,16 +309,47 @@ class Coordinator:
             emitter: Emitter,
             emitter_args: EmitterArgs,
     ) -> None:
-        events = emitter.get_events(emitter_args)
         event_emitter_key = pickle.dumps((emitter, emitter_args))
-        workflow_ids = [workflow.decode('utf-8') for workflow in self.redis.lrange(event_emitter_key, 0, -1)]
-        for event_args in events:
-            self.event_queue.enqueue(
-                self.run_event,
-                args=(event_name, workflow_ids, emitter, event_args),
-                result_ttl=0,
-                failure_ttl=0,
-            )
+        emitter_id = self.get_emitter_id(event_emitter_key)
+
+        # no longer waiting in the queue
+        self.redis.delete(f'emitter-enqueued-{emitter_id}')
+
+        # bail if the emitter is no longer needed
+        if not self.redis.hexists('emitters', emitter_id):
+            return
+
+        if not self.should_run_emitter(emitter_id):
+            self.enqueue_emitter(event_name, emitter, emitter_args)
+            return
+
+        # bail if the emitter is already running elsewhere
+        lease = self.get_emitter_lease(emitter_id)
+        if not lease.acquire():
+            return
+
+        lease.start_heartbeat()
+        try:
+            events = emitter.get_events(emitter_args)
+            for event_args in events:
+                # once the lease is lost, another node will take over; stop
+                # emitting events to avoid them being processed twice
+                if lease.lost.is_set():
+                    return
+
+                # stop once no workflow needs this emitter anymore
+                if not self.redis.hexists('emitters', emitter_id):
+                    return
+
+                # workflows may have been added or removed since
+                workflow_ids = [workflow.decode('utf-8') for workflow in self.redis.lrange(event_emitter_key, 0, -1)]
+
+                self.transport.publish(self, event_name, workflow_ids, emitter, event_args)
+
+            # finite emitters should not be restarted by `supervise_emitters()`
+            self.redis.sadd('emitters-completed', emitter_id)
+        finally:
+            lease.release()
 
 
     def run_event(
@@ -113,6 +365,9 @@ class Coordinator:
                 continue
 
             workflow, volumes = pickle.loads(workflow_details)
+            if event_name not in workflow['on']:
+                continue
+
             payload = emitter.get_event_payload(workflow['on'][event_name], event_args)
             self.job_queue.enqueue(
                 self.run_jobs,
@@ -132,13 +387,46 @@ class Coordinator:
             payload: EventPayload,
             volumes: dict = {},
     ) -> None:
-        # cleanup before executing job
+        # keep track of how long jobs have been queued, and of how long those
+        # that had to be put back for lack of capacity then waited for it
+        job = get_current_job()
+        if self.admission is not None and job is not None and job.enqueued_at is not None:
+            self.admission.record_wait(
+                'admission' if job.meta.get('deferred') else 'queue',
+                (utcnow() - job.enqueued_at).total_seconds(),
+            )
+
+        workflow_jobs = {name: {'executor': workflow.get('executor', 'docker'), **job} for name, job in workflow['jobs'].items()}
+
+        # cleanup before executing job, but only for the executors it uses
         if self.container_prune_timeout is not None:
-            jobs.clean(self.container_prune_timeout)
+            for executor in {workflow_job['executor'] for workflow_job in workflow_jobs.values()}:
+                self.executors[executor].clean(self.container_prune_timeout)
+
+        try:
+            output = jobs.run(
+                workflow_jobs,
+                payload,
+                volumes,
+                self.cache,
+                self.admission,
+                self.executors,
+            )
+        except CapacityError as e:
+            # rq offers no way to only dequeue jobs when there is capacity for
+            # them, so put the remaining ones back at the end of the queue
+            # instead; that way, this worker is free to take on other work
+            # (e.g. events) rather than waiting for capacity with the job's
+            # timeout running
+            remaining_jobs, data = e.args
+            time.sleep(self.admission.poll_interval)
+            self.job_queue.enqueue(
+                self.run_jobs,
+                args=({**workflow, 'jobs': remaining_jobs}, data, volumes),
+                result_ttl=0,
+                failure_ttl=0,
+                meta={'deferred': True},
+            )
+            return
 
-        output = jobs.run(
-            workflow['jobs'],
-            payload,
-            volumes,
-        )
         print(output)
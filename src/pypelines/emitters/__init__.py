@@ -2,4 +2,4 @@
 # -*- coding: utf-8 -*-
 
 
-from . import limit, schedule, sse
+from . import limit, record, replay, schedule, sse
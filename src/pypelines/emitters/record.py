@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import time
+from typing import Iterable
+from pypelines import recordings
+from pypelines.emitter import Emitter
+from pypelines.types import EmitterArgs, EmitterConfig, EventArgs, EventName, EventPayload
+
+
+class RecordEmitter(Emitter):
+    """
+    Wraps another emitter, and records all of the events it emits (along with
+    the time they were emitted at) into a file, to be replayed later on by
+    `ReplayEmitter`.
+
+    Emitters run on whichever worker picks them up, so the file must be on
+    storage that is shared by all workers.
+    """
+
+    def __init__(self, emitter: Emitter, path: str):
+        self.emitter = emitter
+        self.path = path
+
+
+    def get_worker_config(self, event_name: EventName, config: EmitterConfig) -> EmitterArgs:
+        # events are recorded along with the emitter they came from
+        return recordings.get_source(event_name, self.emitter, self.emitter.get_worker_config(event_name, config))
+
+
+    def get_events(self, args: EmitterArgs) -> Iterable[EventArgs]:
+        event_name, emitter_type, emitter_args = args
+        for event_args in self.emitter.get_events(emitter_args):
+            recordings.append(self.path, time.time(), args, event_args)
+            yield event_args
+
+
+    def get_event_payload(self, config: EmitterConfig, args: EventArgs) -> EventPayload:
+        return self.emitter.get_event_payload(config, args)
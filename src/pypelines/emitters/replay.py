@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import time
+import uuid
+from typing import Iterable
+from pypelines import recordings
+from pypelines.emitter import Emitter
+from pypelines.types import EmitterArgs, EmitterConfig, EventArgs, EventName, EventPayload
+
+
+class ReplayEmitter(Emitter):
+    """
+    Wraps another emitter, but rather than emitting new events, replays those
+    previously recorded by `RecordEmitter` for the same event, emitter & worker
+    config.
+
+    Events are replayed with the same intervals as they were recorded with,
+    divided by `speed`: e.g. 10 replays them 10 times faster, and 0 replays them
+    as fast as possible.
+
+    Every instance is a replay run of its own: emitters are registered (and
+    marked completed) by their pickled state, which includes the run id, so
+    that a new run replays the events all over again, and the emitters of
+    earlier runs get pruned.
+    """
+
+    def __init__(self, emitter: Emitter, path: str, speed: float = 1):
+        self.emitter = emitter
+        self.path = path
+        self.speed = speed
+        self.run_id = str(uuid.uuid4())
+
+
+    def get_worker_config(self, event_name: EventName, config: EmitterConfig) -> EmitterArgs:
+        # events are recorded along with the emitter they came from
+        return recordings.get_source(event_name, self.emitter, self.emitter.get_worker_config(event_name, config))
+
+
+    def get_events(self, args: EmitterArgs) -> Iterable[EventArgs]:
+        start = time.time()
+        first_timestamp = None
+        for timestamp, source, event_args in recordings.read(self.path):
+            if source != args:
+                continue
+
+            first_timestamp = first_timestamp if first_timestamp is not None else timestamp
+            if self.speed > 0:
+                delay = start + (timestamp - first_timestamp) / self.speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            yield event_args
+
+
+    def get_event_payload(self, config: EmitterConfig, args: EventArgs) -> EventPayload:
+        return self.emitter.get_event_payload(config, args)
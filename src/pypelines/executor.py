@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from abc import ABC, abstractmethod
+from typing import Any, List, Union
+from pypelines.types import JobConfig
+
+
+class Executor(ABC):
+    @abstractmethod
+    def get_environment_id(self, job: JobConfig) -> str:
+        """
+        Returns an identifier for the environment that a job's steps would be
+        executed in (e.g. the id of the image a container would be launched from).
+
+        Results are cached per environment, so this must change whenever the same
+        command could produce a different output.
+        """
+
+        raise NotImplementedError('get_environment_id must be implemented')
+
+
+    @abstractmethod
+    def start(self, job: JobConfig, volumes: dict = {}) -> Any:
+        """
+        Prepares an environment to execute a job's steps in; e.g. a container.
+
+        Volumes map local paths to the paths that steps will know them by, and
+        the job's `resources` (if any) should be used to limit its environment.
+
+        This method returns a handle, which will be passed along to `execute()`
+        for every step, and to `stop()` once the job is done.
+        """
+
+        raise NotImplementedError('start must be implemented')
+
+
+    @abstractmethod
+    def execute(self, handle: Any, command: Union[str, List[str]]) -> str:
+        """
+        Executes a (already interpolated) step command in the environment.
+
+        Commands are either a list of arguments, or a string to be interpreted
+        by a shell.
+        This method returns the command's output, and raises an exception if the
+        command failed.
+        """
+
+        raise NotImplementedError('execute must be implemented')
+
+
+    @abstractmethod
+    def stop(self, handle: Any) -> None:
+        """
+        Tears down the environment once all of a job's steps have executed.
+        """
+
+        raise NotImplementedError('stop must be implemented')
+
+
+    @property
+    def reserves_host_capacity(self) -> bool:
+        """
+        Whether jobs take up capacity on the docker host (see
+        `AdmissionController`), and must therefore be admitted before starting.
+        """
+
+        return True
+
+
+    def clean(self, age: Union[str, int] = '24h') -> None:
+        """
+        Cleans up leftovers (e.g. of jobs that never got to be stopped) older
+        than the given age.
+        """
+
+        pass
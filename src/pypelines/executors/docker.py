@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import os
+import re
+import subprocess
+from typing import List, Union
+from pypelines.executor import Executor
+from pypelines.types import JobConfig
+
+
+class DockerExecutor(Executor):
+    def get_environment_id(self, job: JobConfig) -> str:
+        """
+        Returns the id of the local image that a container would be launched from,
+        pulling the image first if it's not yet available locally.
+        Tags (e.g. `latest`) can point to different images over time, so the id
+        rather than the name must be part of cache keys.
+        """
+
+        command = ['docker', 'image', 'inspect', '--format', '{{.Id}}', job['runs-on']]
+        output = subprocess.run(command, shell=False, capture_output=True, text=True)
+        if output.returncode != 0:
+            subprocess.run(['docker', 'pull', job['runs-on']], shell=False, check=True, capture_output=True)
+            output = subprocess.run(command, shell=False, check=True, capture_output=True, text=True)
+        return output.stdout.strip()
+
+
+    def start(self, job: JobConfig, volumes: dict = {}) -> str:
+        resources = job.get('resources', {})
+
+        # prepare volume args; e.g. ['-v', '/local/path:'/container/path']
+        volume_binds = [f'{self.get_real_volume_path(src)}:{volumes[src]}' for src in volumes]
+        volume_args = [val for pair in zip(['-v'] * len(volume_binds), volume_binds) for val in pair]
+
+        # prepare resource limit args; e.g. ['--cpus', '0.5', '--memory', '512m']
+        resource_args = [val for key in ['cpus', 'memory'] if key in resources for val in [f'--{key}', str(resources[key])]]
+
+        # launch container
+        init_output = subprocess.run(
+            ['docker', 'run', '-d', '-i', *volume_args, *resource_args, job['runs-on']],
+            shell=False,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return init_output.stdout[:-1]
+
+
+    def execute(self, container_id: str, command: Union[str, List[str]]) -> str:
+        if type(command) is list:
+            command = ['docker', 'exec', '-i', container_id, *command]
+            shell = False
+        else:
+            command = f'docker exec -i {container_id} {command}'
+            shell = True
+
+        # execute command on container
+        output = subprocess.run(
+            command,
+            shell=shell,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        return output.stdout
+
+
+    def stop(self, container_id: str) -> None:
+        # terminate & remove container
+        subprocess.run(
+            ['docker', 'rm', '-f', container_id],
+            shell=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+
+    def clean(self, age: Union[str, int] = '24h') -> None:
+        subprocess.run(
+            ['docker', 'system', 'prune', '-f', f'until={age}'],
+            shell=False,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+
+
+    def get_real_volume_path(self, volume_path: str) -> str:
+        """
+        When a docker container has a host volume mounted, and wants to mount that
+        same volume on another container, the host path must be used rather than
+        the path known in the container.
+
+        This returns the original path on the host by looking at mounts, or the
+        local path if it's not within a mount.
+        """
+
+        mounts_output = subprocess.run(
+            ['cat', '/proc/self/mountinfo'],
+            shell=False,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        mounts = {dst: src for src, dst in re.findall(r'\s(/.*?)\s(/.*?)\s', mounts_output.stdout)}
+
+        mount_path = volume_path
+        while mount_path not in mounts and mount_path != '/':
+            mount_path = os.path.dirname(mount_path)
+
+        return volume_path.replace(mount_path, mounts[mount_path], 1) if mount_path in mounts else volume_path
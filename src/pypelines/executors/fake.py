@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import time
+from typing import List, Union
+from pypelines.executor import Executor
+from pypelines.types import JobConfig
+
+
+class FakeExecutor(Executor):
+    """
+    Pretends to execute steps, without actually executing anything: it merely
+    takes some time to start & execute, and returns empty output.
+    This is meant for load testing the rest of the pipeline (e.g. with replayed
+    events) without depending on docker.
+    """
+
+    def __init__(self, start_duration: float = 0, execute_duration: float = 0):
+        self.start_duration = start_duration
+        self.execute_duration = execute_duration
+
+
+    def get_environment_id(self, job: JobConfig) -> str:
+        return 'fake'
+
+
+    def start(self, job: JobConfig, volumes: dict = {}) -> str:
+        time.sleep(self.start_duration)
+        return 'fake'
+
+
+    def execute(self, handle: str, command: Union[str, List[str]]) -> str:
+        time.sleep(self.execute_duration)
+        return ''
+
+
+    def stop(self, handle: str) -> None:
+        pass
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+from typing import List, Union
+from pypelines.admission import parse_memory
+from pypelines.executor import Executor
+from pypelines.types import JobConfig
+
+
+class LocalExecutor(Executor):
+    """
+    Executes steps as subprocesses on the worker itself, skipping the overhead
+    of a container lifecycle.
+
+    This is NOT a sandbox, and must only be used for trusted workflows: steps
+    run with the worker's full privileges, which includes access to its entire
+    filesystem and to the docker socket it has mounted. They merely run in an
+    empty temporary directory (which is also their home directory), in a
+    session of their own, with a minimal environment and within the job's
+    memory limit.
+
+    Volumes are made available by rewriting command arguments that are a path
+    into one (as it would be known inside a container) to the local path, so
+    that the same commands work for both executors. Only commands given as a
+    list of arguments are rewritten, and only arguments that start with such a
+    path; commands given as a string are passed to the shell untouched.
+    """
+
+    def __init__(self, timeout: int = 3600):
+        self.timeout = timeout
+
+
+    # steps run on the worker, not on the docker host
+    @property
+    def reserves_host_capacity(self) -> bool:
+        return False
+
+
+    def get_environment_id(self, job: JobConfig) -> str:
+        return 'local'
+
+
+    def start(self, job: JobConfig, volumes: dict = {}) -> dict:
+        return {
+            'directory': tempfile.mkdtemp(prefix='pypelines-'),
+            'volumes': volumes,
+            'memory': parse_memory(job['resources']['memory']) if 'memory' in job.get('resources', {}) else None,
+        }
+
+
+    def execute(self, handle: dict, command: Union[str, List[str]]) -> str:
+        if type(command) is list:
+            command = [self.rewrite_path(arg, handle['volumes']) for arg in command]
+            shell = False
+        else:
+            shell = True
+
+        def limit():
+            if handle['memory'] is not None:
+                resource.setrlimit(resource.RLIMIT_AS, (handle['memory'], handle['memory']))
+
+        output = subprocess.run(
+            command,
+            shell=shell,
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=handle['directory'],
+            env={'PATH': os.defpath, 'HOME': handle['directory']},
+            start_new_session=True,
+            preexec_fn=limit,
+            timeout=self.timeout,
+        )
+        return output.stdout
+
+
+    def stop(self, handle: dict) -> None:
+        shutil.rmtree(handle['directory'], ignore_errors=True)
+
+
+    def rewrite_path(self, arg: str, volumes: dict) -> str:
+        """
+        Replaces the start of an argument that is a path into a volume with the
+        local path of that volume.
+        """
+
+        # longest paths first, in case volumes are nested
+        for src, dst in sorted(volumes.items(), key=lambda volume: len(volume[1]), reverse=True):
+            dst = dst.rstrip('/')
+            if arg == dst or arg.startswith(f'{dst}/'):
+                return src.rstrip('/') + arg[len(dst):]
+        return arg
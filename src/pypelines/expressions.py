@@ -4,7 +4,7 @@
 
 import json
 import re
-from typing import Any
+from typing import Any, List
 from pypelines.types import Expression
 
 
@@ -30,6 +30,9 @@ ALLOWED_NAMES = {
 }
 
 
+INTERPOLATION_PATTERN = '\$\{\{\s*(.+?)\s*\}\}'
+
+
 def evaluate(expression: Expression, data: dict) -> Any:
     """
     Evaluates an expression, which can either be a simple string, or a nested
@@ -56,12 +59,20 @@ def interpolate(string: str, data: dict) -> str:
     """
 
     return re.sub(
-        '\$\{\{\s*(.+?)\s*\}\}',
+        INTERPOLATION_PATTERN,
         lambda match: str(evaluate(match.group(1), data)),
         string,
     )
 
 
+def find(string: str) -> List[str]:
+    """
+    Returns the expressions embedded into a string within `${{ }}`.
+    """
+
+    return re.findall(INTERPOLATION_PATTERN, string)
+
+
 def assign(variable: str, value: Any, data: dict) -> dict:
     """
     For convenience, data shall always be available under both:
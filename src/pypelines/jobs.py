@@ -3,18 +3,29 @@
 
 
 import functools
-import subprocess
-import os
-import re
-from typing import List, Union
+import hashlib
+import json
+from typing import Any, Dict, List, Union
 from pypelines import expressions
-from pypelines.types import JobConfig, JobsConfig, StepConfig
-
-
-def run(jobs: JobsConfig, data: dict, volumes: dict = {}) -> dict:
+from pypelines.admission import AdmissionController, CapacityError
+from pypelines.cache import Cache
+from pypelines.executor import Executor
+from pypelines.executors.docker import DockerExecutor
+from pypelines.types import CacheConfig, JobConfig, JobsConfig, StepConfig
+
+
+def run(
+        jobs: JobsConfig,
+        data: dict,
+        volumes: dict = {},
+        cache: Cache = None,
+        admission: AdmissionController = None,
+        executors: Dict[str, Executor] = None,
+) -> dict:
+    executors = executors if executors is not None else {'docker': DockerExecutor()}
     jobs = sort_jobs(jobs)
     output = {}
-    for job_name in jobs:
+    for index, job_name in enumerate(jobs):
         job = jobs[job_name]
 
         dependencies = job.get('needs', [])
@@ -25,7 +36,12 @@ def run(jobs: JobsConfig, data: dict, volumes: dict = {}) -> dict:
         data = {**data}
         try:
             # capture output, and add to existing data dict for dependent jobs
-            output[job_name] = data[job_name] = run_job(job_name, job, data, volumes)
+            executor = executors[job.get('executor', 'docker')]
+            output[job_name] = data[job_name] = run_job(job_name, job, data, volumes, cache, admission, executor)
+        except CapacityError:
+            # leave this job, and the ones after it, to be run once there is
+            # capacity, along with the data gathered so far
+            raise CapacityError({name: jobs[name] for name in list(jobs)[index:]}, data)
         except:
             # keep trying to execute remaining jobs
             continue
@@ -33,68 +49,150 @@ def run(jobs: JobsConfig, data: dict, volumes: dict = {}) -> dict:
     return output
 
 
-def run_job(name: str, job: JobConfig, data: dict, volumes: dict = {}) -> str:
+def run_job(
+        name: str,
+        job: JobConfig,
+        data: dict,
+        volumes: dict = {},
+        cache: Cache = None,
+        admission: AdmissionController = None,
+        executor: Executor = None,
+) -> str:
+    executor = executor if executor is not None else DockerExecutor()
     if len(job['steps']) == 0:
         return ''
 
-    # prepare volume args; e.g. ['-v', '/local/path:'/container/path']
-    volume_binds = [f'{get_real_volume_path(src)}:{volumes[src]}' for src in volumes]
-    volume_args = [val for pair in zip(['-v'] * len(volume_binds), volume_binds) for val in pair]
-
-    # launch container
-    init_output = subprocess.run(
-        ['docker', 'run', '-d', '-i', *volume_args, job['runs-on']],
-        shell=False,
-        check=True,
-        capture_output=True,
-        text=True,
-    )
-    container_id = init_output.stdout[:-1]
+    # steps may depend on changes that earlier steps made to the environment,
+    # so their output can only be reused if all of them are cached (in which
+    # case the job doesn't need an environment either), and every step's key
+    # includes the keys of the steps before it
+    steps_cached = all(step.get('cache', False) for step in job['steps'])
+
+    environment_id = None
+    if cache is not None and (job.get('cache', False) or steps_cached):
+        environment_id = executor.get_environment_id(job)
+
+    # a cached job doesn't even need an environment (e.g. container)
+    job_cache_key = None
+    if cache is not None and job.get('cache', False):
+        job_cache_key = get_cache_key(environment_id, job['steps'], get_job_inputs(name, job, data), volumes)
+        output = cache.get(job_cache_key)
+        if output is not None:
+            return output
+
+    if environment_id is not None and steps_cached:
+        step_data = {**data}
+        step_cache_key = environment_id
+        for step in job['steps']:
+            step_cache_key = get_step_cache_key(step_cache_key, step, step_data, volumes)
+            step_output = cache.get(step_cache_key)
+            if step_output is None:
+                break
+
+            step_data = expressions.assign(name, step_output, step_data)
+        else:
+            if job_cache_key is not None:
+                cache.set(job_cache_key, step_output, get_cache_ttl(job['cache']))
+            return step_output
+
+    # otherwise, all steps must be executed, including those that were cached;
+    # their output may be in the cache, but the changes they made are not
+
+    # only a job that actually starts a container needs capacity for it
+    reservation = None
+    if admission is not None and executor.reserves_host_capacity:
+        reservation = admission.try_reserve(job.get('resources', {}))
+        if reservation is None:
+            raise CapacityError()
+    handle = None
 
     data = {**data}
     try:
+        handle = executor.start(job, volumes)
+
         step_output = ''
+        step_cache_key = environment_id if steps_cached else None
         for step in job['steps']:
+            step_cache_key = get_step_cache_key(step_cache_key, step, data, volumes) if step_cache_key is not None else None
+
             # execute step and collect output (to feed into next step)
-            step_output = run_step(container_id, step, data)
+            step_output = run_step(executor, handle, step, data)
+
+            if step_cache_key is not None:
+                cache.set(step_cache_key, step_output, get_cache_ttl(step['cache']))
 
             # assign output to data variables
             data = expressions.assign(name, step_output, data)
 
+        if job_cache_key is not None:
+            cache.set(job_cache_key, step_output, get_cache_ttl(job['cache']))
+
         return step_output
     finally:
-        # terminate & remove container
-        subprocess.run(
-            ['docker', 'rm', '-f', container_id],
-            shell=False,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
+        if handle is not None:
+            executor.stop(handle)
+        if reservation is not None:
+            admission.release(reservation)
 
 
-def run_step(container_id: str, step: StepConfig, data: dict) -> str:
+def run_step(executor: Executor, handle: Any, step: StepConfig, data: dict) -> str:
     assert 'if' not in step or expressions.evaluate(step['if'], data), 'Step condition not satisfied'
 
     if not 'run' in step:
         return ''
 
-    # parse variables/code into command
-    if type(step['run']) is list:
-        command = ['docker', 'exec', '-i', container_id, *[expressions.interpolate(arg, data) for arg in step['run']]]
-        shell = False
-    else:
-        command = f'docker exec -i {container_id} {expressions.interpolate(step["run"], data)}'
-        shell = True
-
-    # execute command on container
-    output = subprocess.run(
-        command,
-        shell=shell,
-        check=True,
-        capture_output=True,
-        text=True,
-    )
-    return output.stdout
+    # parse variables/code into command, and execute it
+    return executor.execute(handle, interpolate_command(step['run'], data))
+
+
+def interpolate_command(run: Union[str, List[str]], data: dict) -> Union[str, List[str]]:
+    if type(run) is list:
+        return [expressions.interpolate(arg, data) for arg in run]
+    return expressions.interpolate(run, data)
+
+
+def get_job_inputs(name: str, job: JobConfig, data: dict) -> list:
+    """
+    Returns the values of the expressions used in a job's steps: it's those,
+    rather than all of the data (which e.g. includes the time for scheduled
+    events), that determine what a job will end up doing.
+
+    Expressions that depend on the output of earlier steps can't be evaluated
+    up front, but those follow from the other inputs anyway.
+    """
+
+    inputs = []
+    for index, step in enumerate(job['steps']):
+        # after the first step, the job's name & payload refer to the output
+        # of the step before
+        step_data = data if index == 0 else {key: value for key, value in data.items() if key not in [name, 'payload']}
+
+        runs = step.get('run', [])
+        step_expressions = [expression for run in (runs if type(runs) is list else [runs]) for expression in expressions.find(run)]
+        if 'if' in step:
+            step_expressions.append(step['if'])
+
+        for expression in step_expressions:
+            try:
+                inputs.append((expression, expressions.evaluate(expression, step_data)))
+            except Exception as e:
+                inputs.append((expression, type(e).__name__))
+    return inputs
+
+
+def get_step_cache_key(previous_key: str, step: StepConfig, data: dict, volumes: dict = {}) -> str:
+    assert 'if' not in step or expressions.evaluate(step['if'], data), 'Step condition not satisfied'
+
+    return get_cache_key(previous_key, interpolate_command(step.get('run', ''), data), volumes)
+
+
+def get_cache_key(*parts: Any) -> str:
+    serialized = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def get_cache_ttl(config: CacheConfig) -> Union[int, None]:
+    return config.get('ttl') if type(config) is dict else None
 
 
 def sort_jobs(jobs: JobsConfig) -> List[str]:
@@ -116,38 +214,3 @@ def sort_jobs(jobs: JobsConfig) -> List[str]:
     # sort job execution order, taking dependencies into account
     sorted_job_names = sorted(jobs.keys(), key=functools.cmp_to_key(callback))
     return {job_name: jobs[job_name] for job_name in sorted_job_names}
-
-
-def get_real_volume_path(volume_path: str) -> str:
-    """
-    When a docker container has a host volume mounted, and wants to mount that
-    same volume on another container, the host path must be used rather than
-    the path known in the container.
-
-    This returns the original path on the host by looking at mounts, or the
-    local path if it's not within a mount.
-    """
-
-    mounts_output = subprocess.run(
-        ['cat', '/proc/self/mountinfo'],
-        shell=False,
-        check=True,
-        capture_output=True,
-        text=True,
-    )
-    mounts = {dst: src for src, dst in re.findall(r'\s(/.*?)\s(/.*?)\s', mounts_output.stdout)}
-
-    mount_path = volume_path
-    while mount_path not in mounts and mount_path != '/':
-        mount_path = os.path.dirname(mount_path)
-
-    return volume_path.replace(mount_path, mounts[mount_path], 1) if mount_path in mounts else volume_path
-
-
-def clean(age: Union[str, int] = '24h') -> None:
-    subprocess.run(
-        ['docker', 'system', 'prune', '-f', f'until={age}'],
-        shell=False,
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL,
-    )
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import os
+import socket
+import threading
+from redis import Redis
+
+
+# only touch the lease if it is still held by the same owner; a plain
+# EXPIRE/DEL could otherwise extend or remove a lease that has meanwhile
+# expired and been taken over by another node
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def get_node_name() -> str:
+    return socket.gethostname()
+
+
+def get_owner_name() -> str:
+    return f'{get_node_name()}:{os.getpid()}'
+
+
+class Lease:
+    """
+    A renewable, expiring claim on a key in Redis.
+
+    Only one owner can hold a lease at any given time. The owner is expected to
+    keep renewing it (see `start_heartbeat()`) for as long as it wants to hold on
+    to it; if the owner dies, the lease simply expires and can be acquired by
+    someone else.
+    """
+
+    def __init__(self, redis: Redis, key: str, owner: str, ttl: int = 30):
+        self.redis = redis
+        self.key = key
+        self.owner = owner
+        self.ttl = ttl
+        self.lost = threading.Event()
+        self.stopped = threading.Event()
+        self.heartbeat = None
+
+
+    def acquire(self) -> bool:
+        return bool(self.redis.set(self.key, self.owner, nx=True, px=self.ttl * 1000))
+
+
+    def renew(self) -> bool:
+        return bool(self.redis.eval(RENEW_SCRIPT, 1, self.key, self.owner, self.ttl * 1000))
+
+
+    def release(self) -> None:
+        self.stop_heartbeat()
+        self.redis.eval(RELEASE_SCRIPT, 1, self.key, self.owner)
+
+
+    def start_heartbeat(self) -> None:
+        """
+        Renews the lease in a background thread, a few times per ttl so that a
+        single slow roundtrip doesn't cause it to expire.
+        If renewal fails, the lease has been lost (e.g. it expired while this
+        process was stalled, and was taken over elsewhere) and `lost` is set,
+        which the owner must check to stop doing whatever the lease guarded.
+        """
+
+        def beat():
+            while not self.stopped.wait(self.ttl / 3):
+                try:
+                    if not self.renew():
+                        self.lost.set()
+                        return
+                except Exception:
+                    # a transient connection error does not mean the lease is
+                    # gone; keep trying until it actually expires
+                    continue
+
+        self.heartbeat = threading.Thread(target=beat, daemon=True)
+        self.heartbeat.start()
+
+
+    def stop_heartbeat(self) -> None:
+        self.stopped.set()
+        if self.heartbeat is not None and self.heartbeat is not threading.current_thread():
+            self.heartbeat.join()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import os
+import pickle
+import struct
+from typing import Any, Iterable, Tuple
+from pypelines.types import EmitterArgs, EventArgs, EventName
+
+
+Source = Tuple[str, str, Any]
+
+
+# every record is the time it was emitted at and the length of the pickled
+# (source, event args) that follow, where the source identifies the emitter
+# that emitted the event (event name, type of emitter, and its worker config)
+HEADER = struct.Struct('>dI')
+
+
+def get_source(event_name: EventName, emitter: 'Emitter', emitter_args: EmitterArgs) -> Source:
+    """
+    Returns what identifies the events of an emitter in a recording.
+    The emitter's type is included by its full path rather than by its (class)
+    name: that would be the very same string that pickle refers to the class
+    by, and pickle would then reference rather than repeat it, so that these
+    args wouldn't consistently pickle (i.e. hash) the same.
+    """
+
+    emitter_type = type(emitter)
+    return event_name, f'{emitter_type.__module__}.{emitter_type.__qualname__}', emitter_args
+
+
+def append(path: str, timestamp: float, source: Source, event_args: EventArgs) -> None:
+    """
+    Appends an event to a recording.
+    Multiple emitters may be recording into the same file at once: by writing
+    each record in a single append, they won't end up interleaved.
+    """
+
+    data = pickle.dumps((source, event_args))
+    descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(descriptor, HEADER.pack(timestamp, len(data)) + data)
+    finally:
+        os.close(descriptor)
+
+
+def read(path: str) -> Iterable[Tuple[float, Source, EventArgs]]:
+    with open(path, 'rb') as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+
+            timestamp, length = HEADER.unpack(header)
+            data = file.read(length)
+            if len(data) < length:
+                # incomplete record; i.e. still being written
+                return
+
+            source, event_args = pickle.loads(data)
+            yield timestamp, source, event_args
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from abc import ABC, abstractmethod
+from typing import List
+from pypelines.emitter import Emitter
+from pypelines.types import EventArgs, EventName, WorkflowId
+
+
+class Transport(ABC):
+    @abstractmethod
+    def publish(
+            self,
+            coordinator: 'Coordinator',
+            event_name: EventName,
+            workflow_ids: List[WorkflowId],
+            emitter: Emitter,
+            event_args: EventArgs,
+    ) -> None:
+        """
+        Hands an event from an emitter over to be processed elsewhere.
+
+        Emitters are long-running and should not be held up processing the
+        events they emit: this method should return as soon as the event has
+        been stored, and have it be fed into `coordinator.run_event()` by some
+        other worker.
+        """
+
+        raise NotImplementedError('publish must be implemented')
+
+
+    def supervise(self, coordinator: 'Coordinator') -> None:
+        """
+        Makes sure whatever is consuming events is (still) running.
+        This will be called periodically.
+        """
+
+        pass
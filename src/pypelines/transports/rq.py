@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+from typing import List
+from pypelines.emitter import Emitter
+from pypelines.transport import Transport
+from pypelines.types import EventArgs, EventName, WorkflowId
+
+
+class RqTransport(Transport):
+    """
+    Enqueues every event as a separate job on the coordinator's event queue.
+    """
+
+    def publish(
+            self,
+            coordinator: 'Coordinator',
+            event_name: EventName,
+            workflow_ids: List[WorkflowId],
+            emitter: Emitter,
+            event_args: EventArgs,
+    ) -> None:
+        coordinator.event_queue.enqueue(
+            coordinator.run_event,
+            args=(event_name, workflow_ids, emitter, event_args),
+            result_ttl=0,
+            failure_ttl=0,
+        )
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+
+import pickle
+from redis import Redis
+from redis.exceptions import ResponseError
+from typing import List
+from pypelines.emitter import Emitter
+from pypelines.leases import Lease, get_owner_name
+from pypelines.transport import Transport
+from pypelines.types import EventArgs, EventName, WorkflowId
+
+
+class StreamTransport(Transport):
+    """
+    Appends events to a Redis stream, from which a fixed amount of consumers
+    read them in batches through a consumer group.
+
+    Events are only acknowledged once they have been processed; events that a
+    consumer failed to acknowledge (e.g. because it died) are reclaimed by
+    another once they've been pending for `claim_idle` seconds, so every event
+    is delivered at least once.
+    Consumers are long-running jobs on the emitter queue; each holds a lease on
+    its slot, so that `supervise()` can restart those that died.
+
+    The stream is capped at (approximately) `maxlen` entries; if consumers
+    can't keep up, the oldest events will be dropped.
+    """
+
+    def __init__(
+            self,
+            redis_url: str,
+            stream: str = 'events',
+            group: str = 'event',
+            consumers: int = 4,
+            batch_size: int = 100,
+            block: int = 5,
+            claim_idle: int = 60,
+            maxlen: int = 100000,
+            lease_ttl: int = 30,
+    ):
+        self.__setstate__(locals())
+
+
+    # Redis instance is not pickleable, so let's only expose the details required
+    # to reinitialize things after unpickling
+    def __getstate__(self):
+        return {
+            'redis_url': self.redis_url,
+            'stream': self.stream,
+            'group': self.group,
+            'consumers': self.consumers,
+            'batch_size': self.batch_size,
+            'block': self.block,
+            'claim_idle': self.claim_idle,
+            'maxlen': self.maxlen,
+            'lease_ttl': self.lease_ttl,
+        }
+
+
+    def __setstate__(self, state: dict):
+        self.redis_url = state['redis_url']
+        self.redis = Redis.from_url(self.redis_url)
+        self.stream = state['stream']
+        self.group = state['group']
+        self.consumers = state['consumers']
+        self.batch_size = state['batch_size']
+        self.block = state['block']
+        self.claim_idle = state['claim_idle']
+        self.maxlen = state['maxlen']
+        self.lease_ttl = state['lease_ttl']
+
+
+    def consumer_lease_key(self, index: int) -> str:
+        return f'{self.stream}-consumer-{index}-lease'
+
+
+    def consumer_enqueued_key(self, index: int) -> str:
+        return f'{self.stream}-consumer-{index}-enqueued'
+
+
+    def publish(
+            self,
+            coordinator: 'Coordinator',
+            event_name: EventName,
+            workflow_ids: List[WorkflowId],
+            emitter: Emitter,
+            event_args: EventArgs,
+    ) -> None:
+        self.redis.xadd(
+            self.stream,
+            {'event': pickle.dumps((event_name, workflow_ids, emitter, event_args))},
+            maxlen=self.maxlen,
+            approximate=True,
+        )
+
+
+    def supervise(self, coordinator: 'Coordinator') -> None:
+        for index in range(self.consumers):
+            if self.redis.exists(self.consumer_lease_key(index)):
+                continue
+
+            # don't pile up consumers while they're still waiting in the queue
+            if self.redis.set(self.consumer_enqueued_key(index), 1, nx=True, ex=coordinator.emitter_enqueue_ttl):
+                coordinator.emitter_queue.enqueue(
+                    self.consume,
+                    args=(coordinator, index),
+                )
+
+
+    def consume(self, coordinator: 'Coordinator', index: int) -> None:
+        self.redis.delete(self.consumer_enqueued_key(index))
+
+        # bail if this consumer is already running elsewhere
+        lease = Lease(self.redis, self.consumer_lease_key(index), get_owner_name(), self.lease_ttl)
+        if not lease.acquire():
+            return
+
+        lease.start_heartbeat()
+        try:
+            try:
+                self.redis.xgroup_create(self.stream, self.group, id='0', mkstream=True)
+            except ResponseError as e:
+                # group already exists
+                if 'BUSYGROUP' not in str(e):
+                    raise
+
+            consumer = f'consumer-{index}'
+            while not lease.lost.is_set():
+                # pick up events that other consumers failed to acknowledge
+                # before moving on to new ones
+                entries = self.redis.xautoclaim(
+                    self.stream,
+                    self.group,
+                    consumer,
+                    min_idle_time=self.claim_idle * 1000,
+                    start_id='0-0',
+                    count=self.batch_size,
+                )[1]
+                if not entries:
+                    response = self.redis.xreadgroup(
+                        self.group,
+                        consumer,
+                        {self.stream: '>'},
+                        count=self.batch_size,
+                        block=self.block * 1000,
+                    )
+                    entries = response[0][1] if response else []
+
+                for entry_id, fields in entries:
+                    # entries may have been trimmed off the stream since
+                    if not fields:
+                        continue
+
+                    try:
+                        coordinator.run_event(*pickle.loads(fields[b'event']))
+                    except Exception as e:
+                        # like failed rq event jobs, failed events are dropped
+                        # rather than retried forever
+                        print(f'Error processing event: {e}')
+
+                if entries:
+                    self.redis.xack(self.stream, self.group, *[entry_id for entry_id, _ in entries])
+        finally:
+            lease.release()
@@ -16,15 +16,30 @@ EventPayload = Any
 Expression = str | List['Expression']
 
 
+CacheConfig = bool | TypedDict('CacheConfig', {
+    'ttl': NotRequired[int],
+})
+
+
+ResourcesConfig = TypedDict('ResourcesConfig', {
+    'cpus': NotRequired[float],
+    'memory': NotRequired[str | int],
+})
+
+
 StepConfig = TypedDict('StepConfig', {
     'name': NotRequired[str],
     'run': NotRequired[Expression],
     'if': NotRequired[Expression],
+    'cache': NotRequired[CacheConfig],
 })
 JobConfig = TypedDict('JobConfig', {
     'runs-on': Required[str],
+    'executor': NotRequired[str],
     'needs': NotRequired[List[str] | str],
     'steps': Required[List[StepConfig]],
+    'cache': NotRequired[CacheConfig],
+    'resources': NotRequired[ResourcesConfig],
 })
 JobsConfig = Dict[str, JobConfig]
 
@@ -33,5 +48,6 @@ WorkflowId = str
 Workflow = TypedDict('Workflow', {
     'name': NotRequired[str],
     'on': Required[Dict[EventName, EmitterConfig]],
+    'executor': NotRequired[str],
     'jobs': Required[JobsConfig],
 })